@@ -2,6 +2,7 @@
 import time
 import os
 import json
+import logging
 from utils.zip_utils import ZipExtractor
 from utils.file_utils import FileOrganizer
 from utils.gdb_utils import GDBProcessor
@@ -21,12 +22,19 @@ def load_config(path="config.json"):
 def main():
     start_time = time.time()
 
+    # Mensajes agregados a nivel INFO; el detalle por feature class queda en DEBUG
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     try:
         # Subir configuración de JSON en el directorio actual
         config = load_config()
 
         # Extraer y organizar archivos
-        zip_extractor = ZipExtractor()
+        # Opcionales: hilos de extracción y envío de ZIPs comprimidos a procesos
+        zip_extractor = ZipExtractor(
+            max_workers=config.get("zip_workers"),
+            use_processes=config.get("zip_use_processes", False)
+        )
         file_organizer = FileOrganizer()
 
         zip_extractor.process_directory(config["input"], config["output"])
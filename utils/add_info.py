@@ -1,40 +1,112 @@
 import arcpy
-import json
+import functools
+import logging
 import os
+import numpy as np
+from types import MappingProxyType
+
+# Parser JSON nativo si está disponible; json de la librería estándar si no
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+log = logging.getLogger(__name__)
+
+def resolve_json_path(json_path):
+    """
+    Resuelve la ruta absoluta al JSON de códigos catastrales.
+
+    Args:
+        json_path (str): Ruta al JSON, relativa a la raíz del proyecto o absoluta
+
+    Returns:
+        str: Ruta absoluta al archivo JSON
+    """
+    # Resolver ruta al JSON si es relativa
+    if not os.path.isabs(json_path):
+        json_path = os.path.join(
+            os.path.dirname(os.path.dirname(__file__)),  # Subir un nivel desde utils
+            json_path
+        )
+
+    if not os.path.exists(json_path):
+        raise FileNotFoundError(f"No se encuentra el archivo JSON en: {json_path}")
+
+    return os.path.abspath(json_path)
+
+@functools.lru_cache(maxsize=8)
+def _load_codes(abs_path):
+    """
+    Parsea el JSON de códigos catastrales una sola vez por ruta.
+
+    Args:
+        abs_path (str): Ruta absoluta al archivo JSON
+
+    Returns:
+        MappingProxyType: Código municipal (int) -> registro del JSON, de solo
+                          lectura para que la caché se comparta sin riesgo
+    """
+    # Lectura en binario: orjson trabaja sobre bytes y json.loads también los acepta
+    with open(abs_path, 'rb') as f:
+        json_array = _json.loads(f.read())
+
+    codes = {int(item['Codigo_Municipal_Catastral']): item for item in json_array}
+    log.info("Loaded %d municipal codes", len(codes))
+    return MappingProxyType(codes)
+
+def load_cadastral_codes(json_path):
+    """
+    Códigos catastrales compartidos entre todas las instancias.
+
+    Args:
+        json_path (str): Ruta al archivo JSON con códigos catastrales
+
+    Returns:
+        MappingProxyType: Código municipal (int) -> registro del JSON
+    """
+    return _load_codes(resolve_json_path(json_path))
+
+def load_code_tuples(json_path):
+    """
+    Carga los códigos catastrales y los pre-normaliza en tuplas.
+
+    Args:
+        json_path (str): Ruta al archivo JSON con códigos catastrales
+
+    Returns:
+        dict: Código municipal (int) -> (Nombre_Municipio, Nombre_Isla,
+              Codigo_Municipal_ISTAC, Codigo_Isla_INE), con los valores
+              ya convertidos a los tipos de los campos
+
+    Pensado para ejecutarse una sola vez en el proceso principal y
+    compartir el resultado con los workers del pool (se devuelve un dict
+    normal para que pueda serializarse).
+    """
+    # Pre-normalizar valores en tuplas con el orden de los campos a actualizar
+    return {
+        code: (
+            str(item.get('Nombre_Municipio', '')),
+            str(item.get('Nombre_Isla', '')),
+            int(item.get('Codigo_Municipal_ISTAC', 0)),
+            int(item.get('Codigo_Isla_INE', 0))
+        )
+        for code, item in load_cadastral_codes(json_path).items()
+    }
 
 class CadastralInfoManager:
-    def __init__(self, workspace, json_path):
+    def __init__(self, workspace, code_tuples):
         """
         Inicializa el gestor de información catastral.
 
         Args:
             workspace (str): Ruta de la geodatabase de trabajo
-            json_path (str): Ruta al archivo JSON con códigos catastrales
+            code_tuples (dict): Códigos catastrales pre-normalizados
+                                (ver load_code_tuples)
         """
         self.workspace = workspace
-        arcpy.env.workspace = workspace
+        self.code_tuples = code_tuples
 
-        # Resolver ruta al JSON si es relativa
-        if not os.path.isabs(json_path):
-            json_path = os.path.join(
-                os.path.dirname(os.path.dirname(__file__)),  # Subir un nivel desde utils
-                json_path
-            )
-    
-        if not os.path.exists(json_path):
-            raise FileNotFoundError(f"No se encuentra el archivo JSON en: {json_path}")
-        
-        # Sube los códigos catastrales desde el JSON
-        with open(json_path, 'r', encoding='utf-8') as f:
-            json_array = json.load(f)
-            # Convertir JSON a diccionario para acceso rápido
-            self.cadastral_codes = {
-                str(item['Codigo_Municipal_Catastral']): item
-                for item in json_array  
-            }
-        
-        print(f"Loaded {len(self.cadastral_codes)} municipal codes")
-        
         # Definiciones de campos requeridos
         self.field_definitions = {
             'Nombre_Municipio': ('TEXT', 255),
@@ -43,6 +115,27 @@ class CadastralInfoManager:
             'Codigo_Isla_INE': ('LONG', None)
         }
 
+        # Argumento de AddFields: [nombre, tipo, alias, longitud, defecto, dominio]
+        self._add_fields_arg = [
+            [field_name, field_type, '', field_length or '', '', '']
+            for field_name, (field_type, field_length) in self.field_definitions.items()
+        ]
+
+        # dtype de los campos a actualizar; el OID de enlace se antepone en
+        # cada llamada con el nombre real del campo (ver update_cadastral_info)
+        self._value_dtype = [
+            (field_name, f'<U{field_length}' if field_type == 'TEXT' else '<i4')
+            for field_name, (field_type, field_length) in self.field_definitions.items()
+        ]
+
+        # Tabla de consulta en columnas: códigos ordenados + un array por campo,
+        # alineados por posición para resolver cada fila con searchsorted
+        self._lookup_codes = np.array(sorted(code_tuples), dtype=np.int64)
+        self._lookup_columns = [
+            (field_name, np.array([code_tuples[code][i] for code in self._lookup_codes.tolist()], dtype=dtype))
+            for i, (field_name, dtype) in enumerate(self._value_dtype)
+        ]
+
     def manage_fields(self, feature_class):
         """
         Gestiona los campos requeridos en una feature class.
@@ -52,26 +145,21 @@ class CadastralInfoManager:
 
         Proceso:
         1. Lista campos existentes
-        2. Elimina campos definidos si existen
-        3. Añade nuevos campos con tipos específicos
+        2. Elimina en una sola llamada los campos definidos que existan
+        3. Añade todos los campos en una sola llamada a AddFields
         """
-        existing_fields = [field.name for field in arcpy.ListFields(feature_class)]
+        existing = {field.name for field in arcpy.ListFields(feature_class)}
+
+        to_delete = [name for name in existing if name in self.field_definitions]
         
         # Borrar campos existentes que están en la definición
-        for field in existing_fields:
-            if field in self.field_definitions:
-                arcpy.DeleteField_management(feature_class, field)
-                print(f"Deleted field: {field}")
+        if to_delete:
+            arcpy.DeleteField_management(feature_class, to_delete)
+            log.debug("Deleted fields: %s", ", ".join(to_delete))
 
         # Agregar nuevos campos
-        for field_name, (field_type, field_length) in self.field_definitions.items():
-            arcpy.AddField_management(
-                feature_class, 
-                field_name, 
-                field_type, 
-                field_length=field_length
-            )
-            print(f"Added field: {field_name}")
+        arcpy.management.AddFields(feature_class, self._add_fields_arg)
+        log.debug("Added fields: %s", ", ".join(self.field_definitions))
 
     def update_cadastral_info(self, feature_class):
         """
@@ -80,62 +168,46 @@ class CadastralInfoManager:
         Args:
             feature_class (str): Feature class a actualizar
 
+        Raises:
+            Exception: Si la lectura o el ExtendTable fallan (se registra y
+                       se relanza para que el llamador lo detecte)
+
         Proceso:
-        1. Configura cursor de actualización
-        2. Mapea índices de campos
-        3. Actualiza registros con información del JSON
-        4. Reporta número de actualizaciones
+        1. Lee OID y código municipal en bloque (FeatureClassToNumPyArray)
+        2. Localiza cada código en la tabla ordenada con np.searchsorted
+        3. Construye los campos de las filas con código conocido por indexado
+        4. Escribe los campos en una única llamada a ExtendTable
+        5. Reporta número de actualizaciones
         """
         try:
-            # Adquirir lookup de campos nuevos a actualizar
-            fields = ['Codigo_Municipal_Catastral'] + list(self.field_definitions.keys())
-            
-            print(f"\nUpdating fields for: {os.path.basename(feature_class)}")
-            
-            # Adquirir campos que serán actualizados
-            with arcpy.da.UpdateCursor(feature_class, fields) as cursor:
-                field_indices = {field: i for i, field in enumerate(fields)}
-                print(f"Field positions: {field_indices}")
-                
-                updates = 0
-                for row in cursor:
-                    municipal_code = str(row[field_indices['Codigo_Municipal_Catastral']])
-                    
-                    if municipal_code in self.cadastral_codes:
-                        info = self.cadastral_codes[municipal_code]
-                        # Actualizar campos con información del JSON
-                        row[field_indices['Nombre_Municipio']] = info.get('Nombre_Municipio', '')
-                        row[field_indices['Nombre_Isla']] = info.get('Nombre_Isla', '')
-                        row[field_indices['Codigo_Municipal_ISTAC']] = info.get('Codigo_Municipal_ISTAC', 0)
-                        row[field_indices['Codigo_Isla_INE']] = info.get('Codigo_Isla_INE', 0)
-                        cursor.updateRow(row)
-                        updates += 1
-                
-                print(f"Updated {updates} rows")
-                
-        except Exception as e:
-            print(f"Error updating {feature_class}: {str(e)}")
+            # ExtendTable enlaza por un campo real, no por el token OID@
+            oid_field = arcpy.Describe(feature_class).OIDFieldName
+            data = arcpy.da.FeatureClassToNumPyArray(
+                feature_class,
+                [oid_field, 'Codigo_Municipal_Catastral'],
+                null_value=-1
+            )
 
-    def process_feature_classes(self, feature_types, dataset_prefix):
-        """
-        Procesa múltiples feature classes.
+            updated = 0
+            keys = self._lookup_codes
+            if len(data) and len(keys):
+                codes = data['Codigo_Municipal_Catastral'].astype(np.int64)
+                idx = np.minimum(np.searchsorted(keys, codes), len(keys) - 1)
 
-        Args:
-            feature_types (list): Tipos de features a procesar
-            dataset_prefix (str): Prefijo del dataset (Rustico/Urbano)
+                # Solo se escriben los registros con código presente en el JSON
+                hit = keys[idx] == codes
+                idx = idx[hit]
+                updated = len(idx)
 
-        Proceso:
-        1. Itera sobre tipos de features
-        2. Verifica existencia
-        3. Gestiona campos
-        4. Actualiza información
-        """
-        for feature_type in feature_types:
-            feature_class = f"{self.workspace}\\{dataset_prefix}\\{dataset_prefix}_{feature_type}"
+                if updated:
+                    values = np.empty(updated, dtype=[(oid_field, '<i4')] + self._value_dtype)
+                    values[oid_field] = data[oid_field][hit]
+                    for field_name, column in self._lookup_columns:
+                        values[field_name] = column[idx]
+                    arcpy.da.ExtendTable(feature_class, oid_field, values, oid_field, append_only=False)
             
-            if arcpy.Exists(feature_class):
-                print(f"\nProcessing: {feature_class}")
-                self.manage_fields(feature_class)
-                self.update_cadastral_info(feature_class)
-            else:
-                print(f"Feature class not found: {feature_class}")
\ No newline at end of file
+            log.info("Updated %d rows in %s", updated, os.path.basename(feature_class))
+                
+        except Exception as e:
+            log.error("Error updating %s: %s", feature_class, e)
+            raise
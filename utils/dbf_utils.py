@@ -1,8 +1,158 @@
 # -*- coding: utf-8 -*-
 import os
 import arcpy
+import multiprocessing
 import re
-import json
+import numpy as np
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from utils.add_info import load_cadastral_codes
+
+# Cerrojo compartido por los workers de merge_tables (ver _init_worker)
+_SCHEMA_LOCK = None
+
+def _init_worker(schema_lock):
+    """
+    Inicializador de los workers de merge_tables.
+
+    Args:
+        schema_lock (multiprocessing.Lock): Serializa los cambios de esquema
+                                            en la geodatabase de destino
+    """
+    global _SCHEMA_LOCK
+    _SCHEMA_LOCK = schema_lock
+
+# Tipo de campo de arcpy -> dtype numpy de TableToNumPyArray
+_NUMPY_TYPES = {
+    'SmallInteger': '<i2',
+    'Integer': '<i4',
+    'Single': '<f4',
+    'Double': '<f8',
+    'Date': '<M8[us]'
+}
+
+def _union_schema(sources, extra_fields):
+    """
+    Une los esquemas de los DBF de un grupo.
+
+    Args:
+        sources (list): Lista de (ruta DBF, valores catastrales)
+        extra_fields (list): Campos añadidos como (nombre, dtype numpy, alias)
+
+    Returns:
+        tuple: (dtype numpy de la tabla final,
+                lista de (ruta DBF, valores catastrales, campos a leer))
+
+    Promueve tipos y anchos de texto en orden de aparición; los campos
+    catastrales van al final. Los DBF cuyo esquema no se puede leer se
+    informan y se omiten.
+    """
+    extra_names = {name for name, _, _ in extra_fields}
+
+    merged = {}
+    readable = []
+    for dbf_path, values in sources:
+        try:
+            listed = arcpy.ListFields(dbf_path)
+        except Exception as e:
+            print(f"Error procesando tabla {os.path.basename(dbf_path)}: {str(e)}")
+            continue
+
+        fields = []
+        for f in listed:
+            if f.name in extra_names:
+                continue
+            dt = f'<U{max(f.length, 1)}' if f.type == 'String' else _NUMPY_TYPES.get(f.type)
+            if dt is None:
+                continue
+            fields.append(f.name)
+            merged[f.name] = np.dtype(dt) if f.name not in merged else np.promote_types(merged[f.name], dt)
+        readable.append((dbf_path, values, fields))
+
+    dtype = np.dtype(list(merged.items()) + [(name, dt) for name, dt, _ in extra_fields])
+    return dtype, readable
+
+def _append_dbf(output_table, dbf_path, fields, values, extra_names):
+    """
+    Añade las filas de un DBF a la tabla final.
+
+    Args:
+        output_table (str): Tabla final
+        dbf_path (str): DBF de origen
+        fields (list): Campos del DBF presentes en la tabla final
+        values (tuple): Valores catastrales del DBF
+        extra_names (list): Nombres de los campos catastrales
+
+    El DBF se lee entero antes de insertar nada, así un archivo dañado
+    no deja filas a medias. El cursor solo abarca los campos de este DBF:
+    los que le faltan quedan a NULL, igual que los nulos leídos.
+    """
+    with arcpy.da.SearchCursor(dbf_path, fields) as rows:
+        data = list(rows)
+
+    with arcpy.da.InsertCursor(output_table, fields + extra_names) as cursor:
+        insert_row = cursor.insertRow
+        for row in data:
+            insert_row(row + values)
+
+def _build_table(final_gdb, merged_name, sources, extra_fields, exists):
+    """
+    Crea una tabla final a partir de sus DBF de origen.
+
+    Función de módulo para poder ejecutarse en un proceso worker: cada
+    tabla final es independiente y se escribe con un nombre distinto.
+
+    Args:
+        final_gdb (str): Geodatabase donde crear la tabla
+        merged_name (str): Nombre de la tabla final
+        sources (list): Lista de (ruta DBF, valores catastrales)
+        extra_fields (list): Campos añadidos como (nombre, dtype numpy, alias)
+        exists (bool): Si la tabla ya existía en la geodatabase
+
+    Returns:
+        None si la tabla se creó correctamente, o su nombre si falló
+
+    Comportamiento:
+    - Borrado, creación y alias van bajo el cerrojo de esquema: varios
+      workers comparten la misma File GDB
+    - La inserción de filas se hace fuera del cerrojo, en paralelo
+    """
+    try:
+        print(f"\nMerging {len(sources)} tables for {merged_name}...")
+        output_table = os.path.join(final_gdb, merged_name)
+        dtype, readable = _union_schema(sources, extra_fields)
+
+        with _SCHEMA_LOCK or nullcontext():
+            if exists:
+                print(f"Removing existing merged table: {merged_name}")
+                arcpy.Delete_management(output_table)
+
+            if not readable:
+                print(f"No readable DBF files for {merged_name}")
+                return None
+
+            # Tabla vacía con el esquema unido y sus alias
+            arcpy.da.NumPyArrayToTable(np.zeros(0, dtype=dtype), output_table)
+            for field_name, _, field_alias in extra_fields:
+                arcpy.management.AlterField(
+                    output_table, field_name, new_field_alias=field_alias
+                )
+
+        # Los DBF se añaden de uno en uno, sin cargar el grupo entero en memoria
+        extra_names = [name for name, _, _ in extra_fields]
+        for dbf_path, values, fields in readable:
+            try:
+                _append_dbf(output_table, dbf_path, fields, values, extra_names)
+            except Exception as e:
+                print(f"Error procesando tabla {os.path.basename(dbf_path)}: {str(e)}")
+                continue
+
+        print(f"✓ Successfully created {merged_name}")
+        return None
+
+    except Exception as e:
+        print(f"Error merging {merged_name}: {str(e)}")
+        return merged_name
 
 class DBFProcessor:
     """
@@ -27,7 +177,7 @@ class DBFProcessor:
             ALLOWED_PATTERNS (dict): Patrones permitidos para tipos de tabla
             CODE_FIELD (str): Nombre del campo para código municipal
             workspace (str): Espacio de trabajo actual
-            cadastral_codes (dict): Códigos catastrales cargados del JSON
+            cadastral_codes (MappingProxyType): Código municipal (int) -> registro del JSON
         """
         # Mapeo de prefijos
         self.PREFIX_MAPPING = {
@@ -42,26 +192,23 @@ class DBFProcessor:
             "RUSUBPARCELA": r".*_RUSUBPARCELA\.dbf$"
         }
 
+        # Regex precompiladas: un solo match da código municipal y tipo de tabla
+        self._combined_re = re.compile(
+            r"^(?P<code>\d+).*_(?P<ttype>"
+            + "|".join(re.escape(t) for t in self.ALLOWED_PATTERNS)
+            + r")\.dbf$",
+            re.IGNORECASE
+        )
+        self._prefix_re = re.compile(r"[ru]A", re.IGNORECASE)
+        self._table_types = {t.lower(): t for t in self.ALLOWED_PATTERNS}
+        # Sufijos en minúsculas para descartar nombres con un solo endswith
+        self._dbf_suffixes = tuple(f"_{t}.dbf" for t in self._table_types)
+
         self.CODE_FIELD = "COD_MUNI"
         self.workspace = None
         
-        # Resolver ruta al JSON si es relativa
-        if not os.path.isabs(json_path):
-            json_path = os.path.join(
-                os.path.dirname(os.path.dirname(__file__)),
-                "cod_catastrales.json"
-            )
-
-        if not os.path.exists(json_path):
-            raise FileNotFoundError(f"No se encuentra el archivo de códigos catastrales en: {json_path}")
-        
-        # Cargar códigos catastrales
-        with open(json_path, 'r', encoding='utf-8') as f:
-            json_array = json.load(f)
-            self.cadastral_codes = {
-                str(item['Codigo_Municipal_Catastral']): item
-                for item in json_array  
-            }
+        # Códigos catastrales compartidos (parseados una vez por proceso)
+        self.cadastral_codes = load_cadastral_codes(json_path)
 
         # Definición de campos a añadir
         self.field_definitions = {
@@ -71,6 +218,12 @@ class DBFProcessor:
             'Codigo_Isla_INE': ('LONG', None, 'Código INE Isla')
         }
 
+        # Columnas añadidas a cada tabla final: (nombre, dtype numpy, alias)
+        self._extra_fields = [(self.CODE_FIELD, '<i4', 'Código Municipal Catastral')] + [
+            (field_name[:10], f'<U{field_length}' if field_type == 'TEXT' else '<i4', field_alias)
+            for field_name, (field_type, field_length, field_alias) in self.field_definitions.items()
+        ]
+
     def process_directory(self, input_dirs, final_gdb):
         """
         Proceso principal de procesamiento de DBFs.
@@ -80,185 +233,148 @@ class DBFProcessor:
             final_gdb (str): Ruta a la geodatabase final
         
         Proceso:
-        1. Configura el espacio de trabajo
-        2. Procesa cada directorio de entrada
-        3. Fusiona todas las tablas al final
+        1. Registra la geodatabase de destino
+        2. Agrupa los DBF de cada directorio por tabla final
+        3. Fusiona cada grupo directamente en la geodatabase
         """
         try:
-            # Establecer el espacio de trabajo
+            # Geodatabase de destino (todas las rutas son absolutas, sin arcpy.env)
             self.workspace = final_gdb
-            arcpy.env.workspace = self.workspace
-            print(f"Setting workspace to: {self.workspace}")
+            print(f"Target geodatabase: {self.workspace}")
 
+            # Tabla final -> [(ruta DBF, código municipal)]
+            groups = defaultdict(list)
             for input_dir in input_dirs:
                 if not os.path.exists(input_dir):
                     print(f"Warning: Directory does not exist: {input_dir}")
                     continue
                 
-                self._process_dbf_files(input_dir, final_gdb)
+                self._process_dbf_files(input_dir, groups)
             
-            # Hacer merge de todas las tablas procesadas
+            # Hacer merge de todas las tablas agrupadas
             print("\nMerging all processed tables...")
-            self.merge_tables(final_gdb)
+            self.merge_tables(final_gdb, groups)
             
         except Exception as e:
             print(f"Error in process_directory: {str(e)}")
             raise
 
-    def _process_dbf_files(self, input_dir, final_gdb):
+    @staticmethod
+    def _walk_dbfs(root, suffixes=('.dbf',)):
         """
-        Procesa archivos DBF encontrados en un directorio.
+        Recorre recursivamente un directorio devolviendo los archivos DBF.
+
+        Args:
+            root (str): Directorio raíz a recorrer
+            suffixes (tuple): Terminaciones válidas, en minúsculas
+
+        Yields:
+            os.DirEntry: Entrada de cada archivo cuyo nombre termina en
+                         alguno de los sufijos
+
+        Características:
+        - Usa os.scandir con una pila explícita en lugar de os.walk
+        - Descarta por sufijo (un endswith con tupla) antes de aplicar ninguna regex
+        """
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith(suffixes):
+                        yield entry
+
+    def _process_dbf_files(self, input_dir, groups):
+        """
+        Agrupa los archivos DBF encontrados en un directorio por tabla final.
         
         Args:
             input_dir (str): Directorio con archivos DBF
-            final_gdb (str): Geodatabase donde guardar las tablas
+            groups (dict): Tabla final -> lista de (ruta DBF, código municipal),
+                           se completa en el sitio
         
         Proceso:
         1. Filtra archivos DBF relevantes
-        2. Extrae información del nombre
-        3. Crea y puebla tablas en la geodatabase
-        4. Añade información catastral adicional
+        2. Extrae código municipal, dataset y tipo de tabla del nombre
+        3. Registra el DBF en el grupo de su tabla final (sin tocar la GDB)
+        4. Muestra un resumen por tabla en lugar de una línea por archivo
         """
-        for root, _, files in os.walk(input_dir):
-            # Filtrar archivos DBF relevantes
-            dbf_files = [f for f in files if any(re.match(pattern, f, re.IGNORECASE) 
-                        for pattern in self.ALLOWED_PATTERNS.values())]
-            
-            if dbf_files:
-                print(f"Scanning folder: {root}")
-                for file in dbf_files:
-                    print(f"Found DBF file: {file}")
-                    
-                    # Extraer código municipal
-                    municipal_code = self._extract_municipal_code(file)
-                    
-                    if not municipal_code:
-                        print(f"No municipal code found in: {file}")
-                        continue
-                    
-                    print(f"Successfully found municipal code: {municipal_code}")
-
-                    # Determinar dataset y tipo de tabla
-                    prefix_match = re.search(r'[ru]A', file, re.IGNORECASE)
-                    if not prefix_match:
-                        continue
-
-                    prefix = prefix_match.group()
-
-                    if prefix not in self.PREFIX_MAPPING:
-                        continue
-
-                    dataset = self.PREFIX_MAPPING[prefix]
-                    table_type = self._extract_table_type(file)
-                    if not table_type:
-                        continue
-
-                    print(f"\nProcesando: {file}")
-                    print(f"- Dataset: {dataset}")
-                    print(f"- Tipo: {table_type}")
-                    print(f"- Código: {municipal_code}")
-
-                    # Crear tabla en GDB
-                    table_name = f"{dataset}_{table_type}_{municipal_code}"
-
-                    try:
-                        target_table = os.path.join(final_gdb, table_name)
-                        
-                        if arcpy.Exists(target_table):
-                            print(f"- Eliminando tabla existente: {table_name}")
-                            arcpy.Delete_management(target_table)
-                        
-                        print(f"- Convirtiendo DBF a tabla: {table_name}")
-                        arcpy.TableToTable_conversion(
-                            in_rows=os.path.join(root, file),
-                            out_path=final_gdb,
-                            out_name=table_name
-                        )
-
-                        # Añadir y poblar campo de código municipal
-                        print(f"- Añadiendo código municipal")
-                        arcpy.AddField_management(
-                            target_table, 
-                            self.CODE_FIELD, 
-                            "LONG", 
-                            field_alias="Código Municipal Catastral"
-                        )
-                        
-                        with arcpy.da.UpdateCursor(target_table, [self.CODE_FIELD]) as cursor:
-                            for row in cursor:
-                                row[0] = municipal_code
-                                cursor.updateRow(row)
-
-                        # Añadir información adicional del JSON
-                        self._add_cadastral_info(target_table, municipal_code)
-                        
-                        print(f"✓ Tabla completada: {table_name}")
-
-                    except Exception as e:
-                        print(f"Error procesando tabla {file}: {str(e)}")
-                        continue
-
-    def _extract_municipal_code(self, filename):
-        """Extraer código municipal del nombre"""
-        pattern = re.compile(r"^(\d+)")
-        match = pattern.match(filename)
-        return int(match.group(1)) if match else None
-
-    def _extract_table_type(self, filename):
-        """Extraer tipo de tabla del nombre"""
-        for table_type, pattern in self.ALLOWED_PATTERNS.items():
-            if re.match(pattern, filename, re.IGNORECASE):
-                return table_type
-        return None
+        scanned = 0
+        found = Counter()
+        for entry in self._walk_dbfs(input_dir, self._dbf_suffixes):
+            scanned += 1
+            # Un único match por candidato
+            file = entry.name
+            match = self._combined_re.match(file)
+            if not match:
+                continue
 
-    def _add_cadastral_info(self, table, municipal_code):
-        """Añadir información del JSON de códigos catastrales"""
-        try:
-            code_info = self.cadastral_codes.get(str(municipal_code))
+            # Código municipal y tipo de tabla del mismo match
+            municipal_code = int(match.group('code'))
             
-            if not code_info:
-                print(f"No se encuentra información para código {municipal_code}")
-                return
+            if not municipal_code:
+                print(f"No municipal code found in: {file}")
+                continue
 
-            # Añadir campos usando las definiciones
-            for field_name, (field_type, field_length, field_alias) in self.field_definitions.items():
-                try:
-                    arcpy.AddField_management(
-                        table,
-                        field_name[:10],  # Limitar nombre a 10 caracteres
-                        field_type,
-                        field_length=field_length,
-                        field_alias=field_alias
-                    )
-                    
-                    # Poblar campo si existe en el JSON
-                    if field_name in code_info:
-                        value = code_info[field_name]
-                        expression = f"'{value}'" if field_type == 'TEXT' else str(value)
-                        arcpy.CalculateField_management(
-                            table, 
-                            field_name[:10],
-                            expression,
-                            "PYTHON3"
-                        )
-                
-                except Exception as e:
-                    print(f"Error añadiendo campo {field_name}: {str(e)}")
+            # Determinar dataset
+            prefix_match = self._prefix_re.search(file)
+            if not prefix_match:
+                continue
 
-        except Exception as e:
-            print(f"Error añadiendo información catastral: {str(e)}")
+            prefix = prefix_match.group()
+
+            if prefix not in self.PREFIX_MAPPING:
+                continue
+
+            dataset = self.PREFIX_MAPPING[prefix]
+            table_type = self._table_types[match.group('ttype').lower()]
+
+            merged_name = f"{dataset}_{table_type}"
+            groups[merged_name].append((entry.path, municipal_code))
+            found[merged_name] += 1
+
+        print(f"Scanned {input_dir}: {scanned} candidate DBF files, {sum(found.values())} valid")
+        for merged_name, count in sorted(found.items()):
+            print(f"- {merged_name}: {count}")
+
+    def _cadastral_values(self, municipal_code):
+        """
+        Valores a escribir para un código municipal.
+
+        Returns:
+            tuple: (COD_MUNI, Nombre_Municipio, Nombre_Isla,
+                    Codigo_Municipal_ISTAC, Codigo_Isla_INE); los campos del
+                    JSON quedan vacíos ('' / 0) si el código no está en el archivo
+        """
+        code_info = self.cadastral_codes.get(municipal_code)
+        if not code_info:
+            print(f"No se encuentra información para código {municipal_code}")
+            return (municipal_code, '', '', 0, 0)
+
+        return (
+            municipal_code,
+            str(code_info.get('Nombre_Municipio', '')),
+            str(code_info.get('Nombre_Isla', '')),
+            int(code_info.get('Codigo_Municipal_ISTAC', 0)),
+            int(code_info.get('Codigo_Isla_INE', 0))
+        )
 
-    def merge_tables(self, final_gdb):
+    def merge_tables(self, final_gdb, groups):
         """
-        Fusiona tablas por tipo después del procesamiento.
+        Fusiona los DBF de cada grupo directamente en su tabla final.
         
         Args:
-            final_gdb (str): Geodatabase con las tablas a fusionar
+            final_gdb (str): Geodatabase donde crear las tablas finales
+            groups (dict): Tabla final -> lista de (ruta DBF, código municipal)
         
         Proceso:
-        1. Agrupa tablas por tipo
-        2. Fusiona cada grupo en una tabla final
-        3. Limpia tablas individuales
+        1. Resuelve los valores catastrales de cada DBF en el proceso principal
+        2. Construye cada tabla final en paralelo (un proceso por tabla)
+           con los campos catastrales ya rellenos, leyendo un DBF cada vez;
+           los cambios de esquema en la geodatabase se serializan
+        3. Informa de las tablas que no se pudieron crear
         4. Crea tablas finales:
            - Urbano_Carvia
            - Rustico_Carvia
@@ -266,49 +382,39 @@ class DBFProcessor:
            - Rustico_RUSUBPARCELA
         """
         try:
-            # Definir grupos de tablas para el merge
-            merged_tables = {
-                "Urbano_Carvia": [],
-                "Rustico_Carvia": [],
-                "Rustico_RUCULTIVO": [],
-                "Rustico_RUSUBPARCELA": []
+            # Una sola lectura del catálogo en lugar de un Exists por tabla
+            existing = {
+                name.lower()
+                for _, _, tables in arcpy.da.Walk(final_gdb, datatype="Table")
+                for name in tables
             }
 
-            # Extraer todas las tablas de la geodatabase
-            arcpy.env.workspace = final_gdb
-            tables = arcpy.ListTables()
-
-            # Agrupar tablas por tipo
-            for table in tables:
-                if "_Carvia_" in table:
-                    if "Rustico" in table:
-                        merged_tables["Rustico_Carvia"].append(os.path.join(final_gdb, table))
-                    else:
-                        merged_tables["Urbano_Carvia"].append(os.path.join(final_gdb, table))
-                elif "_RUCULTIVO_" in table:
-                    merged_tables["Rustico_RUCULTIVO"].append(os.path.join(final_gdb, table))
-                elif "_RUSUBPARCELA_" in table:
-                    merged_tables["Rustico_RUSUBPARCELA"].append(os.path.join(final_gdb, table))
-
-            # Merge tablas por tipo
-            for merged_name, table_list in merged_tables.items():
-                if table_list:
-                    print(f"\nMerging tables for {merged_name}...")
-                    output_table = os.path.join(final_gdb, merged_name)
-                    
-                    if arcpy.Exists(output_table):
-                        print(f"Removing existing merged table: {merged_name}")
-                        arcpy.Delete_management(output_table)
-
-                    print(f"Merging {len(table_list)} tables...")
-                    arcpy.Merge_management(table_list, output_table)
-                    
-                    print(f"Cleaning up individual tables...")
-                    for table in table_list:
-                        arcpy.Delete_management(table)
-                    
-                    print(f"✓ Successfully created {merged_name}")
+            tasks = [
+                (
+                    final_gdb,
+                    merged_name,
+                    [(dbf_path, self._cadastral_values(code)) for dbf_path, code in sources],
+                    self._extra_fields,
+                    merged_name.lower() in existing
+                )
+                for merged_name, sources in groups.items()
+                if sources
+            ]
+            if not tasks:
+                return
+
+            workers = max(1, min(len(tasks), multiprocessing.cpu_count() // 2))
+            with multiprocessing.Pool(
+                processes=workers,
+                initializer=_init_worker,
+                initargs=(multiprocessing.Lock(),)
+            ) as pool:
+                failed = [name for name in pool.starmap(_build_table, tasks) if name]
+
+            # Una tabla fallida no detiene al resto; se informa al final
+            if failed:
+                print(f"Tablas sin fusionar correctamente: {', '.join(failed)}")
 
         except Exception as e:
             print(f"Error merging tables: {str(e)}")
-            raise
\ No newline at end of file
+            raise
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import os
 import shutil
+import subprocess
+import sys
 
 class FileOrganizer:
     """
@@ -15,6 +17,7 @@ class FileOrganizer:
             RUSTICO_CODE (str): Código identificador para archivos rústicos ('RA')
             URBANO_CODE (str): Código identificador para archivos urbanos ('UA')
             CATEGORY_DIRS (dict): Mapeo de códigos a nombres de directorios
+            CATEGORY_NAMES (frozenset): Nombres de directorios de categoría
         """
         self.RUSTICO_CODE = "RA"
         self.URBANO_CODE = "UA"
@@ -22,6 +25,7 @@ class FileOrganizer:
             self.RUSTICO_CODE: "Rústico",
             self.URBANO_CODE: "Urbano"
         }
+        self.CATEGORY_NAMES = frozenset(self.CATEGORY_DIRS.values())
 
     def organize_files(self, base_dir):
         """
@@ -32,35 +36,65 @@ class FileOrganizer:
         
         Proceso:
         1. Crea directorios por categoría
-        2. Recorre subdirectorios recursivamente
+        2. Recorre los subdirectorios inmediatos de base_dir (uno por ZIP extraído)
         3. Clasifica y mueve archivos según categoría
         4. Limpia directorios temporales
         """
         # Crear directorios de categorías
         category_paths = self._create_category_dirs(base_dir)
         
-        # Recorrer subdirectorios
-        for root, _, _ in os.walk(base_dir):
-            if any(category in root for category in self.CATEGORY_DIRS.values()):
-                continue  # Saltar directorios de categorías ya creados
-                
-            folder_name = os.path.basename(root)
-            category = self._get_category(folder_name)
-            
-            if category:
+        # Recorrer solo el primer nivel: las carpetas a clasificar cuelgan de base_dir
+        leftovers = []
+        with os.scandir(base_dir) as it:
+            for entry in it:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                if entry.name in self.CATEGORY_NAMES:
+                    continue  # Saltar directorios de categorías ya creados
+
+                # Toda carpeta de primer nivel que no es de categoría se elimina al final
+                leftovers.append(entry.path)
+
+                category = self._get_category(entry.name)
+                if not category:
+                    continue
+
                 target_dir = category_paths[category]
                 # Mover contenidos a su directorio destino
-                self._move_contents(root, target_dir)
-                # Renombrar archivos en el directorio de destino
-                for item in os.listdir(target_dir):
-                    item_path = os.path.join(target_dir, item)
-                    if os.path.isdir(item_path):
-                        self._rename_files_in_directory(item_path)
-
-        for item in os.listdir(base_dir):
-            item_path = os.path.join(base_dir, item)
-            if os.path.isdir(item_path) and item not in self.CATEGORY_DIRS.values():
-                shutil.rmtree(item_path)
+                moved_dirs = self._move_contents(entry.path, target_dir)
+                # Renombrar archivos solo en los directorios recién movidos
+                for moved_dir in moved_dirs:
+                    self._rename_files_in_directory(moved_dir)
+
+        self._fast_rmtree(leftovers)
+
+    @staticmethod
+    def _fast_rmtree(paths):
+        """
+        Elimina varios árboles de directorios con la herramienta nativa del sistema.
+
+        Args:
+            paths (list): Directorios a eliminar
+
+        Comportamiento:
+        - POSIX: una única llamada a `rm -rf` para todos los directorios
+        - Windows: shutil.rmtree directamente (cmd.exe reinterpreta &, ^ y %
+          en las rutas, que pueden aparecer en nombres de municipio)
+        - Si la herramienta nativa falla o no existe, termina con shutil.rmtree
+        """
+        if not paths:
+            return
+
+        try:
+            if sys.platform != "win32" and shutil.which("rm"):
+                subprocess.run(["rm", "-rf", "--", *paths], check=False)
+        except OSError:
+            pass
+
+        # Respaldo para lo que la herramienta nativa no haya podido borrar
+        # (ignore_errors ya cubre las rutas que no existen)
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
 
     def _create_category_dirs(self, base_dir):
         """
@@ -89,10 +123,8 @@ class FileOrganizer:
         Returns:
             str: Nombre de la categoría o None si no coincide
         """
-        if len(folder_name) >= 5:
-            type_code = folder_name[3:5]
-            return self.CATEGORY_DIRS.get(type_code)
-        return None
+        # Un slice corto devuelve '' y no coincide con ningún código
+        return self.CATEGORY_DIRS.get(folder_name[3:5].upper())
 
     def _move_contents(self, source_dir, target_dir):
         """
@@ -102,27 +134,54 @@ class FileOrganizer:
             source_dir (str): Directorio origen
             target_dir (str): Directorio destino
         
+        Returns:
+            list: Rutas de los subdirectorios destino creados o fusionados
+        
         Comportamiento:
         - Fusiona contenidos si el destino existe
         - Mueve carpetas completas si no existe el destino
         """
-        for item in os.listdir(source_dir):
-            src_path = os.path.join(source_dir, item)
-            if not os.path.isdir(src_path):
-                continue
+        # Materializar la lista: el directorio se modifica mientras se recorre
+        with os.scandir(source_dir) as it:
+            entries = [entry for entry in it if entry.is_dir(follow_symlinks=False)]
 
-            dst_path = os.path.join(target_dir, item)
+        moved_dirs = []
+        for entry in entries:
+            src_path = entry.path
+            dst_path = os.path.join(target_dir, entry.name)
+            moved_dirs.append(dst_path)
             
             if os.path.exists(dst_path):
                 # Merge contents if destination exists
-                for content in os.listdir(src_path):
-                    content_src = os.path.join(src_path, content)
-                    content_dst = os.path.join(dst_path, content)
+                with os.scandir(src_path) as it:
+                    contents = list(it)
+                for content in contents:
+                    content_dst = os.path.join(dst_path, content.name)
                     if not os.path.exists(content_dst):
-                        shutil.move(content_src, content_dst)
+                        self._move(content.path, content_dst)
             else:
                 # Mover carpeta completa si no existe el destino
-                shutil.move(src_path, dst_path)
+                self._move(src_path, dst_path)
+
+        return moved_dirs
+
+    @staticmethod
+    def _move(src_path, dst_path):
+        """
+        Mueve un archivo o carpeta con un único rename si es posible.
+
+        Args:
+            src_path (str): Ruta origen
+            dst_path (str): Ruta destino (no debe existir)
+
+        Comportamiento:
+        - Mismo sistema de archivos: os.rename, O(1) sin importar el tamaño
+        - Otro volumen (OSError): respaldo con shutil.move (copia + borrado)
+        """
+        try:
+            os.rename(src_path, dst_path)
+        except OSError:
+            shutil.move(src_path, dst_path)
 
     def _rename_files_in_directory(self, directory):
         """
@@ -134,15 +193,25 @@ class FileOrganizer:
         Proceso:
         1. Extrae prefijo del nombre del directorio
         2. Renombra solo archivos (no directorios)
-        3. Excluye archivos ZIP del proceso
+        3. Excluye archivos ZIP y los que ya llevan el prefijo
+        4. Falla si el nombre destino ya existe, sin sobrescribirlo
         """
         dir_name = os.path.basename(directory)
         prefix = dir_name[:7] + "_"
 
-        for file in os.listdir(directory):
-            if not file.lower().endswith(('.zip', '.zip')):
-                file_path = os.path.join(directory, file)
-                if os.path.isfile(file_path):
-                    new_name = f"{prefix}{file}"
-                    new_path = os.path.join(directory, new_name)
-                    os.rename(file_path, new_path)
\ No newline at end of file
+        # Materializar la lista para no volver a ver los archivos ya renombrados
+        with os.scandir(directory) as it:
+            entries = list(it)
+
+        for entry in entries:
+            if entry.name.lower().endswith('.zip') or not entry.is_file(follow_symlinks=False):
+                continue
+            # Ya renombrado en una ejecución anterior
+            if entry.name.startswith(prefix):
+                continue
+
+            new_path = os.path.join(directory, f"{prefix}{entry.name}")
+            # os.rename sobrescribe en POSIX: nunca pisar un archivo existente
+            if os.path.exists(new_path):
+                raise FileExistsError(f"El destino ya existe, no se renombra: {new_path}")
+            os.rename(entry.path, new_path)
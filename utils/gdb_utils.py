@@ -1,9 +1,45 @@
 # -*- coding: utf-8 -*-
 import arcpy
+import heapq
+import logging
 import os
 import multiprocessing
-from contextlib import contextmanager
-from utils.add_info import CadastralInfoManager
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from utils.add_info import CadastralInfoManager, load_code_tuples
+
+# Estado compartido por los workers de la fusión final (ver _init_merge_worker)
+_CODE_TUPLES = None
+_DATASET_LOCKS = {}
+
+def _init_worker():
+    """
+    Inicializador de los workers del pool.
+
+    Configura el entorno de arcpy una sola vez por proceso worker; arcpy
+    ya está importado a nivel de módulo, por lo que su arranque se paga al
+    crear el worker y no en la primera tarea.
+    """
+    arcpy.env.overwriteOutput = True
+    # Los workers ya reparten la CPU entre sí: sin paralelismo interno extra
+    arcpy.env.parallelProcessingFactor = "1"
+
+    # Los procesos hijos no heredan la configuración de logging de main()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+def _init_merge_worker(dataset_locks, code_tuples):
+    """
+    Inicializador de los workers de la fusión final.
+
+    Args:
+        dataset_locks (dict): Nombre del dataset -> multiprocessing.Lock
+        code_tuples (dict): Códigos catastrales cargados en el proceso principal
+    """
+    global _DATASET_LOCKS, _CODE_TUPLES
+    _DATASET_LOCKS = dataset_locks
+    _CODE_TUPLES = code_tuples
+
+    _init_worker()
 
 class GDBProcessor:
     """
@@ -27,6 +63,7 @@ class GDBProcessor:
             MUNICIPAL_CODE_FIELD (str): Campo de código municipal
             CHUNKS_PER_TYPE (int): Chunks por tipo de dataset
             max_workers (int): Número máximo de workers paralelos
+            MAX_TASKS_PER_WORKER (int): Lotes de chunks por worker antes de reciclarlo
         """
         self.RUSTICO_DATASET = "Rustico"
         self.URBANO_DATASET = "Urbano"
@@ -52,6 +89,7 @@ class GDBProcessor:
         
         self.CHUNKS_PER_TYPE = max(2, used_cores // 2)
         self.max_workers = used_cores
+        self.MAX_TASKS_PER_WORKER = 4
         
         print(f"\nConfiguración de procesamiento:")
         print(f"CPUs totales: {cpu_count}")
@@ -91,9 +129,10 @@ class GDBProcessor:
         Proceso:
         1. Crea directorio temporal
         2. Genera chunks balanceados
-        3. Procesa chunks en paralelo
-        4. Combina resultados en GDB final
-        5. Limpia archivos temporales
+        3. Carga los códigos catastrales e importa los chunks en paralelo
+        4. Combina las importaciones de todos los chunks en la GDB final
+           (un único Append por feature) y añade la información catastral
+        5. Limpia archivos temporales (también si el proceso falla)
         """
         base_temp_dir = os.path.join(os.path.dirname(final_gdb), "temp_processing")
         chunk_temp_dir = os.path.join(base_temp_dir, "chunks")
@@ -104,30 +143,45 @@ class GDBProcessor:
             chunk_gdbs = self._create_balanced_chunks(input_dirs, chunk_temp_dir)
             print(f"\nChunks creados: {len(chunk_gdbs)}")
             
+            # Cargar códigos catastrales una sola vez para todos los workers
+            code_tuples = load_code_tuples("cod_catastrales.json")
+
             # Procesar chunks en paralelo
-            with multiprocessing.Pool(processes=self.max_workers) as pool:
-                tasks = [(input_files, gdb_path) for gdb_path, input_files in chunk_gdbs.items()]
+            # Workers reciclados cada pocos lotes para liberar la memoria de arcpy
+            with multiprocessing.Pool(
+                processes=self.max_workers,
+                initializer=_init_worker,
+                maxtasksperchild=self.MAX_TASKS_PER_WORKER
+            ) as pool:
+                tasks = [(input_files, gdb_path) for gdb_path, (_, input_files) in chunk_gdbs.items()]
                 results = pool.starmap(self._process_chunk_gdb, tasks)
-            
-            if not any(results):
+
+            # Chunk -> (dataset, {feature class importada: shapeType}), solo los correctos
+            chunk_shapes = {
+                gdb_path: (chunk_gdbs[gdb_path][0], shape_map)
+                for (_, gdb_path), shape_map in zip(tasks, results)
+                if shape_map is not None
+            }
+            if not chunk_shapes:
                 raise Exception("No chunks processed successfully")
 
             # Fusionar chunks en GDB final
             print("\nMerging chunks into final GDB...")
-            self._merge_final_gdbs(chunk_gdbs.keys(), final_gdb)
+            self._merge_final_gdbs(chunk_shapes, final_gdb, code_tuples)
 
             # Compactar la geodatabase
             print("\nCompactando geodatabase final...")
             arcpy.management.Compact(final_gdb)
-            
-            # Limpieza de directorios temporales
-            print("\nLimpiando directorios temporales...")
-            self._cleanup_temp_dir(base_temp_dir)
                 
         except Exception as e:
             print(f"Error en proceso principal: {str(e)}")
             raise
 
+        finally:
+            # Limpieza de directorios temporales, también si algo ha fallado
+            print("\nLimpiando directorios temporales...")
+            self._cleanup_temp_dir(base_temp_dir)
+
     def _create_balanced_chunks(self, input_dirs, temp_dir):
         """
         Crea chunks balanceados basados en tamaños de archivo.
@@ -137,14 +191,15 @@ class GDBProcessor:
             temp_dir (str): Directorio temporal para almacenar las GDBs de chunks
 
         Returns:
-            dict: Diccionario con rutas de GDB como claves y listas de archivos como valores
+            dict: Diccionario con rutas de GDB como claves y tuplas
+                  (dataset, lista de archivos) como valores
 
         Proceso:
         1. Para cada directorio de entrada:
             - Detecta si es rústico o urbano
             - Calcula offset basado en el índice
             - Recopila archivos y tamaños
-            - Distribuye archivos en chunks equilibrados
+            - Distribuye archivos en chunks equilibrados, etiquetados con su dataset
             - Crea GDBs para cada chunk
         """
         chunk_gdbs = {}
@@ -154,6 +209,7 @@ class GDBProcessor:
             # Detección de prefijo
             is_rustico = any(r in input_dir for r in ["Rustico", "Rústico"])
             prefix = "R" if is_rustico else "U"
+            dataset = self.RUSTICO_DATASET if is_rustico else self.URBANO_DATASET
             chunk_offset = idx * self.CHUNKS_PER_TYPE
             
             # Debug info
@@ -161,31 +217,22 @@ class GDBProcessor:
             print(f"Prefijo: {prefix}")
             print(f"Offset: {chunk_offset}")
             
-            # Recopilar archivos y tamaños
-            files_with_size = []
-            total_size = 0
-            for root, _, files in os.walk(input_dir):
-                for f in files:
-                    if f.lower().endswith('.shp'):
-                        path = os.path.join(root, f)
-                        size = os.path.getsize(path)
-                        files_with_size.append((path, size))
-                        total_size += size
-            
-            # Crear chunks balanceados por tamaño
+            # Crear chunks balanceados por tamaño (LPT: el mayor al chunk más ligero)
             chunks = [[] for _ in range(self.CHUNKS_PER_TYPE)]
             chunk_sizes = [0] * self.CHUNKS_PER_TYPE
+            heap = [(0, i) for i in range(self.CHUNKS_PER_TYPE)]
             
             # Ordenar archivos por tamaño
-            for file_path, size in sorted(files_with_size, key=lambda x: x[1], reverse=True):
-                smallest_idx = chunk_sizes.index(min(chunk_sizes))
+            for file_path, size in sorted(self._iter_shp(input_dir), key=lambda x: x[1], reverse=True):
+                current_size, smallest_idx = heapq.heappop(heap)
                 chunks[smallest_idx].append(file_path)
-                chunk_sizes[smallest_idx] += size
+                chunk_sizes[smallest_idx] = current_size + size
+                heapq.heappush(heap, (chunk_sizes[smallest_idx], smallest_idx))
             
             # Crear GDBs para cada chunk
             for i, chunk_files in enumerate(chunks):
                 if chunk_files:
-                    total_chunk_size = sum(os.path.getsize(f) for f in chunk_files)
+                    total_chunk_size = chunk_sizes[i]
                     chunk_num = i + chunk_offset
                     chunk_name = f"chunk_{prefix}{chunk_num}.gdb"
                     gdb_path = os.path.join(temp_dir, chunk_name)
@@ -194,10 +241,35 @@ class GDBProcessor:
                     print(f"Creando GDB: {chunk_name}")
                     
                     arcpy.CreateFileGDB_management(temp_dir, os.path.basename(gdb_path))
-                    chunk_gdbs[gdb_path] = chunk_files
+                    chunk_gdbs[gdb_path] = (dataset, chunk_files)
         
         return chunk_gdbs
 
+    @staticmethod
+    def _iter_shp(root):
+        """
+        Recorre recursivamente un directorio devolviendo shapefiles y sus tamaños.
+
+        Args:
+            root (str): Directorio raíz a recorrer
+
+        Yields:
+            tuple: (ruta del shapefile, tamaño en bytes)
+
+        Características:
+        - Usa os.scandir con una pila explícita en lugar de os.walk
+        - Reutiliza el stat cacheado de DirEntry (sin os.path.getsize)
+        """
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith('.shp'):
+                        yield entry.path, entry.stat().st_size
+
     def _process_chunk_gdb(self, input_files, chunk_gdb):
         """
         Procesa una GDB de chunk de forma independiente.
@@ -207,83 +279,75 @@ class GDBProcessor:
             chunk_gdb (str): Ruta de la geodatabase de chunk
 
         Returns:
-            bool: True si el procesamiento fue exitoso, False en caso de error
+            dict: Feature class importada -> shapeType si el procesamiento
+                  fue exitoso, None en caso de error
 
         Proceso:
-        1. Configuración inicial de workspace
-        2. Creación de datasets
-        3. Importación de shapefiles
-        4. Configuración de códigos municipales
-        5. Creación de feature classes
-        6. Append de feature classes
-        7. Actualización de información catastral
+        1. Importación de shapefiles
+        2. Configuración de códigos municipales
+        3. Consulta de tipos de geometría de lo importado
+
+        Los datasets y la información catastral se resuelven directamente
+        en la GDB final (ver _merge_final_gdbs), sin copia intermedia.
         """
         try:
             print(f"\nProcesando chunk GDB: {chunk_gdb}")
             with self._managed_workspace(chunk_gdb):
-                # 1. Crear datasets
-                self._create_datasets(chunk_gdb)
-                print("Datasets creados")
-
-                # 2. Importar shapefiles
+                # 1. Importar shapefiles (GDB nueva: duplicados resueltos en Python)
+                seen = set()
+                imported = []
                 for shp_path in input_files:
                     try:
                         base_name = os.path.splitext(os.path.basename(shp_path))[0]
                         fc_name = f"T{base_name}" if not base_name.startswith('T') else base_name
                         
-                        if not arcpy.Exists(fc_name):
-                            arcpy.FeatureClassToFeatureClass_conversion(
-                                shp_path,
-                                chunk_gdb,
-                                fc_name
-                            )
-                            print(f"Importado: {fc_name}")
+                        if fc_name in seen:
+                            continue
+
+                        arcpy.FeatureClassToFeatureClass_conversion(
+                            shp_path,
+                            chunk_gdb,
+                            fc_name
+                        )
+                        # Solo tras importar: si falla, un duplicado posterior puede sustituirlo
+                        seen.add(fc_name)
+                        imported.append(fc_name)
+                        print(f"Importado: {fc_name}")
                     except Exception as e:
                         print(f"Error importando {shp_path}: {str(e)}")
                         continue
                 
-                # 3. Configurar códigos municipales
-                self._setup_municipal_code_field(chunk_gdb)
+                # 2. Configurar códigos municipales (sobre las importadas, sin listar la GDB)
+                self._setup_municipal_code_field(chunk_gdb, imported)
                 print("Códigos municipales configurados")
-                
-                # 4. Crear feature classes
-                self._create_feature_classes(chunk_gdb)
-                print("Feature classes creadas")
-                
-                # 5. Append feature classes
-                self._append_feature_classes(chunk_gdb)
-                print("Append completado")
-                
-                # 6. Añadir y actualizar información catastral
-                cadastral_manager = CadastralInfoManager(chunk_gdb, "cod_catastrales.json")
-                for dataset in self.DATASETS:
-                    print(f"\nUpdating cadastral info for {dataset}...")
-                    cadastral_manager.process_feature_classes(self.FEATURES, dataset)
-                print("Cadastral info update completado")
-                
-                # 7. Limpeza de workspace antes de finalizar
-                arcpy.env.workspace = None
-                return True
+
+                # 3. Tipos de geometría de las importadas: una sola consulta por chunk
+                return self._get_shape_map(chunk_gdb, imported)
                 
         except Exception as e:
             print(f"Error processing chunk {chunk_gdb}: {str(e)}")
-            return False
+            return None
         finally:
             # Asegurar que el espacio de trabajo está limpio
             arcpy.env.workspace = None
 
-    def _merge_final_gdbs(self, chunk_gdbs, final_gdb):
+    def _merge_final_gdbs(self, chunk_shapes, final_gdb, code_tuples):
         """
         Combina todas las GDBs de chunks.
         
         Args:
-            chunk_gdbs (list): Lista de GDBs de chunks
+            chunk_shapes (dict): GDB de chunk -> (dataset, {feature class: shapeType})
+                                 (ver _process_chunk_gdb)
             final_gdb (str): Ruta de GDB final
+            code_tuples (dict): Códigos catastrales (ver load_code_tuples)
         
         Proceso:
         1. Crea GDB final si no existe
         2. Crea datasets necesarios
-        3. Combina features por tipo y dataset
+        3. Agrupa las importaciones de los chunks por dataset y feature:
+           cada chunk solo alimenta el dataset de su tipo
+        4. Combina features por tipo y dataset en paralelo
+        5. Informa de las feature classes que fallaron, sin abortar el proceso
         """
         if not arcpy.Exists(final_gdb):
             arcpy.CreateFileGDB_management(
@@ -293,53 +357,164 @@ class GDBProcessor:
         
         try:
             self._create_datasets(final_gdb)
+
+            # (dataset, feature) -> rutas completas de las importaciones de sus chunks
+            matches_by_feature = defaultdict(list)
+            shape_map = {}
+            for chunk_gdb, (dataset, chunk_shape_map) in chunk_shapes.items():
+                for feature, fcs in self._index_by_feature(chunk_shape_map).items():
+                    for fc in fcs:
+                        fc_path = os.path.join(chunk_gdb, fc)
+                        matches_by_feature[(dataset, feature)].append(fc_path)
+                        shape_map[fc_path] = chunk_shape_map[fc]
             
-            for dataset in self.DATASETS:
-                for feature in self.FEATURES:
-                    self._merge_feature_type(chunk_gdbs, final_gdb, dataset, feature)
+            # Cada par (dataset, feature) escribe en una feature class distinta
+            tasks = [
+                (
+                    final_gdb, dataset, feature, matches,
+                    {fc_path: shape_map[fc_path] for fc_path in matches}
+                )
+                for (dataset, feature), matches in matches_by_feature.items()
+            ]
+            if not tasks:
+                return
+
+            # Cada tarea trabaja entera bajo el lock de su dataset: los dos
+            # datasets avanzan en paralelo, sus feature classes en serie.
+            # Más workers que datasets solo esperarían al lock
+            dataset_locks = {dataset: multiprocessing.Lock() for dataset in self.DATASETS}
+            with multiprocessing.Pool(
+                processes=min(len(self.DATASETS), self.max_workers, len(tasks)),
+                initializer=_init_merge_worker,
+                initargs=(dataset_locks, code_tuples)
+            ) as pool:
+                failed = [name for name in pool.starmap(self._merge_feature_type, tasks) if name]
+
+            # Un fallo no detiene al resto ni a las etapas siguientes,
+            # pero se informa al final para que no pase desapercibido
+            if failed:
+                print(f"Feature classes sin fusionar correctamente: {', '.join(failed)}")
                     
         except Exception as e:
             print(f"Error merging GDBs: {str(e)}")
             raise
 
-    def _merge_feature_type(self, chunk_gdbs, final_gdb, dataset, feature):
+    def _merge_feature_type(self, final_gdb, dataset, feature, matches, shape_map):
         """
         Combina un tipo específico de feature desde todos los chunks en la GDB final.
 
         Args:
-            chunk_gdbs (list): Lista de GDBs de chunks a combinar
             final_gdb (str): Ruta de la geodatabase final
             dataset (str): Nombre del dataset ('Rustico' o 'Urbano')
             feature (str): Tipo de feature a combinar ('ALTIPUN', 'CONSTRU', etc.)
+            matches (list): Feature classes importadas en los chunks para el feature
+            shape_map (dict): Feature class -> shapeType de matches
+
+        Returns:
+            str: Nombre de la feature class destino si falló, None si no
 
         Comportamiento:
-        1. Construye rutas de feature classes objetivo y fuente
-        2. Recopila feature classes existentes de los chunks
-        3. Realiza conversión directa si hay una sola fuente
-        4. Ejecuta merge si hay múltiples fuentes
-        5. Manejo de errores por feature class
+        1. Elige el template y filtra las fuentes con su misma geometría
+        2. Si el destino ya existe (re-ejecución), lo elimina para reemplazarlo
+        3. Con una sola fuente, copia la feature class completa (Copy)
+        4. Si no, crea la feature class objetivo vacía desde el template y
+           añade todas las fuentes de todos los chunks con un único Append,
+           con los índices retirados durante la carga
+        5. Añade y rellena la información catastral
+        6. Manejo de errores por feature class
         """
+        # Cada worker parte de un workspace limpio
+        arcpy.env.workspace = None
+
+        template = self._find_template(feature, matches, shape_map)
+        if not template:
+            return None
+
+        target_geom = shape_map[template]
+        source_fcs = [fc for fc in matches if shape_map[fc] == target_geom]
         target_fc = os.path.join(final_gdb, dataset, f"{dataset}_{feature}")
-        source_fcs = []
-        
-        for chunk_gdb in chunk_gdbs:
-            fc_path = os.path.join(chunk_gdb, dataset, f"{dataset}_{feature}")
-            if arcpy.Exists(fc_path):
-                source_fcs.append(fc_path)
-        
-        if source_fcs:
-            try:
+
+        try:
+            # Toda la secuencia (crear/copiar, índices, Append, campos) cambia
+            # esquema o datos del dataset: File GDB lo bloquea a nivel de
+            # dataset, así que se hace entera bajo su lock
+            with _DATASET_LOCKS.get(dataset) or nullcontext():
+                # Una ejecución anterior sobre la misma GDB: se reemplaza el
+                # destino en lugar de añadir (duplicaría todas las filas)
+                if arcpy.Exists(target_fc):
+                    arcpy.management.Delete(target_fc)
+                    print(f"Reemplazando: {os.path.basename(target_fc)}")
+
+                copied = False
+                # Una sola fuente: copia directa entre File GDBs
                 if len(source_fcs) == 1:
-                    arcpy.FeatureClassToFeatureClass_conversion(
-                        source_fcs[0],
+                    try:
+                        arcpy.management.Copy(source_fcs[0], target_fc)
+                        copied = True
+                        print(f"Copied: {os.path.basename(target_fc)}")
+                    except arcpy.ExecuteError as e:
+                        print(f"Copy no disponible para {feature}, se usa Append: {str(e)}")
+
+                # Crear feature class vacía con el esquema del template
+                if not copied:
+                    arcpy.CreateFeatureclass_management(
                         os.path.dirname(target_fc),
-                        os.path.basename(target_fc)
+                        os.path.basename(target_fc),
+                        template=template,
+                        spatial_reference=self.SPATIAL_REF
                     )
-                else:
-                    arcpy.Merge_management(source_fcs, target_fc)
-                print(f"Merged: {os.path.basename(target_fc)}")
-            except Exception as e:
-                print(f"Error merging {feature}: {str(e)}")
+
+                if not copied:
+                    with self._deferred_indexes(target_fc):
+                        arcpy.Append_management(source_fcs, target_fc, "TEST")
+                    print(f"Merged: {os.path.basename(target_fc)} ({len(source_fcs)} fuentes)")
+
+                # Información catastral sobre la feature class final
+                cadastral_manager = CadastralInfoManager(final_gdb, _CODE_TUPLES)
+                cadastral_manager.manage_fields(target_fc)
+                cadastral_manager.update_cadastral_info(target_fc)
+        except Exception as e:
+            print(f"Error merging {feature}: {str(e)}")
+            return os.path.basename(target_fc)
+        return None
+
+    @staticmethod
+    @contextmanager
+    def _deferred_indexes(fc):
+        """
+        Context manager que retira los índices de una feature class durante una carga masiva.
+
+        Args:
+            fc (str): Feature class destino de la carga
+
+        Comportamiento:
+        - Elimina el índice espacial y los índices de atributos de usuario
+        - Al salir (también con error) los vuelve a crear una sola vez
+          sobre todos los datos cargados
+        """
+        attribute_indexes = [
+            (index.name, [field.name for field in index.fields], index.isUnique, index.isAscending)
+            for index in arcpy.ListIndexes(fc)
+            if not index.name.upper().startswith("FDO_")
+        ]
+        has_spatial_index = arcpy.Describe(fc).hasSpatialIndex
+
+        for name, _, _, _ in attribute_indexes:
+            arcpy.management.RemoveIndex(fc, name)
+        if has_spatial_index:
+            arcpy.management.RemoveSpatialIndex(fc)
+
+        try:
+            yield
+        finally:
+            if has_spatial_index:
+                arcpy.management.AddSpatialIndex(fc)
+            for name, fields, unique, ascending in attribute_indexes:
+                arcpy.management.AddIndex(
+                    fc, fields, name,
+                    "UNIQUE" if unique else "NON_UNIQUE",
+                    "ASCENDING" if ascending else "NON_ASCENDING"
+                )
 
     @staticmethod
     def _cleanup_temp_dir(temp_dir):
@@ -350,7 +525,8 @@ class GDBProcessor:
             temp_dir (str): Directorio a limpiar
         
         Características:
-        - Reintentos automáticos
+        - Intento inicial sin esperas
+        - Reintentos automáticos solo si quedan archivos
         - Limpieza de archivos .lock
         - Verificación de eliminación
         - Reporte de errores detallado
@@ -358,15 +534,20 @@ class GDBProcessor:
         if not os.path.exists(temp_dir):
             return
 
-        # Limpiar workspace y cache
-        arcpy.env.workspace = None
-        arcpy.ClearWorkspaceCache_management()
-    
-        # Importar módulos necesarios
         import time
         import shutil
         from pathlib import Path
 
+        # Primer intento directo: sin bloqueos no hace falta esperar
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        if not os.path.exists(temp_dir):
+            print("Limpieza completada con éxito")
+            return
+
+        # Quedaron archivos: liberar workspace y cache antes de reintentar
+        arcpy.env.workspace = None
+        arcpy.ClearWorkspaceCache_management()
+
         max_retries = 3
         retry_delay = 2  # segundos
 
@@ -405,32 +586,40 @@ class GDBProcessor:
                     except:
                         pass
 
-    def _setup_municipal_code_field(self, gdb_path):
+    def _setup_municipal_code_field(self, gdb_path, fc_list=None):
         """
         Configura y actualiza el campo de código municipal en todas las feature classes.
 
         Args:
             gdb_path (str): Ruta de la geodatabase a procesar
+            fc_list (list, opcional): Feature classes ya conocidas; si no se
+                                      indica se listan las de la GDB
 
         Proceso:
         1. Configura workspace temporal
         2. Itera sobre feature classes
         3. Añade campo de código municipal si no existe
-        4. Extrae y actualiza códigos municipales
+        4. Extrae el código y lo asigna con CalculateField
         5. Manejo de errores por feature class
         """
         arcpy.env.workspace = gdb_path
 
-        for fc in arcpy.ListFeatureClasses():
+        if fc_list is None:
+            fc_list = arcpy.ListFeatureClasses()
+
+        for fc in fc_list:
             try:
                 if not arcpy.ListFields(fc, self.MUNICIPAL_CODE_FIELD):
                     arcpy.AddField_management(fc, self.MUNICIPAL_CODE_FIELD, "LONG")
 
+                # Valor constante: se calcula en el motor de ArcGIS sin cursor Python
                 codigo_municipal = int(os.path.basename(fc)[1:6])
-                with arcpy.da.UpdateCursor(fc, [self.MUNICIPAL_CODE_FIELD]) as cursor:
-                    for row in cursor:
-                        row[0] = codigo_municipal
-                        cursor.updateRow(row)
+                arcpy.management.CalculateField(
+                    fc,
+                    self.MUNICIPAL_CODE_FIELD,
+                    str(codigo_municipal),
+                    "PYTHON3"
+                )
                 print(f"Código municipal calculado para: {fc}")
             except Exception as e:
                 print(f"Error procesando {fc}: {str(e)}")
@@ -458,70 +647,60 @@ class GDBProcessor:
                     print(f"Error creando dataset {dataset}: {str(e)}")
                     raise
 
-    def _create_feature_classes(self, gdb_path):
-        """
-        Crea feature classes en los datasets especificados.
+    def _get_shape_map(self, gdb_path, fc_list=None):
         """
-        arcpy.env.workspace = gdb_path
+        Devuelve el tipo de geometría de cada feature class de la GDB.
 
-        for dataset in self.DATASETS:
-            dataset_path = os.path.join(gdb_path, dataset)
-            
-            for feature in self.FEATURES:
-                fc_name = f"{dataset}_{feature}"
-                if not arcpy.Exists(os.path.join(dataset_path, fc_name)):
-                    template = self._find_template(gdb_path, feature)
-                    if template:
-                        arcpy.CreateFeatureclass_management(
-                            dataset_path, fc_name, 
-                            template=template,
-                            spatial_reference=self.SPATIAL_REF
-                        )
-                        print(f"Feature class creada: {fc_name}")
+        Args:
+            gdb_path (str): Ruta de la geodatabase
+            fc_list (list, opcional): Feature classes ya conocidas; si no se
+                                      indica se listan las de la GDB
 
-    def _append_feature_classes(self, gdb_path):
-        """
-        Append secuencial a los feature classes de los datasets.
+        Returns:
+            dict: Nombre de feature class -> shapeType
+
+        Se llama a Describe una sola vez por feature class; las que no
+        pueden describirse se omiten.
         """
+        shape_map = {}
         with self._managed_workspace(gdb_path):
-            for dataset in self.DATASETS:
-                dataset_path = os.path.join(gdb_path, dataset)
+            for fc in (fc_list if fc_list is not None else arcpy.ListFeatureClasses()):
+                try:
+                    shape_map[fc] = arcpy.Describe(fc).shapeType
+                except:
+                    continue
+        return shape_map
 
-                for feature in self.FEATURES:
-                    target_fc = os.path.join(dataset_path, f"{dataset}_{feature}")
-                    if not arcpy.Exists(target_fc):
-                        continue
+    def _index_by_feature(self, fc_names):
+        """
+        Agrupa nombres de feature class por el tipo de feature que contienen.
 
-                    # Adquirir tipo de geometría
-                    target_geom = arcpy.Describe(target_fc).shapeType
-                    
-                    # Filtrar feature class de origen por geometría
-                    source_fcs = []
-                    for fc in arcpy.ListFeatureClasses():
-                        if feature in fc.upper() and fc != os.path.basename(target_fc):
-                            try:
-                                if arcpy.Describe(fc).shapeType == target_geom:
-                                    source_fcs.append(fc)
-                            except:
-                                continue
-
-                    if source_fcs:
-                        try:
-                            arcpy.Append_management(source_fcs, target_fc, "TEST")
-                            print(f"Append completado para: {os.path.basename(target_fc)}")
-                        except Exception as e:
-                            print(f"Error en append de {os.path.basename(target_fc)}: {str(e)}")
-
-    def _find_template(self, gdb_path, feature_type):
+        Args:
+            fc_names (iterable): Nombres de feature class
+
+        Returns:
+            dict: Feature (p. ej. 'CONSTRU') -> lista de feature classes cuyo
+                  nombre lo contiene, en el orden recibido
+        """
+        by_feature = defaultdict(list)
+        for fc in fc_names:
+            fc_upper = fc.upper()
+            for feat in self.FEATURES:
+                if feat in fc_upper:
+                    by_feature[feat].append(fc)
+        return by_feature
+
+    def _find_template(self, feature_type, matches, shape_map):
         """
         Encontrar el template de feature class para un tipo específico.
         Maneja casos especiales como ALTIPUN.
+
+        Args:
+            feature_type (str): Tipo de feature buscado
+            matches (list): Feature classes candidatas (ver _index_by_feature)
+            shape_map (dict): Feature class -> shapeType (ver _get_shape_map)
         """
-        arcpy.env.workspace = gdb_path
         feature_type_upper = feature_type.upper()
-
-        # Adquirir posibles templates
-        matches = [fc for fc in arcpy.ListFeatureClasses() if feature_type_upper in fc.upper()]
         
         if not matches:
             return None
@@ -530,18 +709,14 @@ class GDBProcessor:
         if feature_type_upper == "ALTIPUN":
             # Búsqueda de geometría Point
             for fc in matches:
-                try:
-                    desc = arcpy.Describe(fc)
-                    if desc.shapeType == "Point":
-                        print(f"Using Point geometry template for {feature_type}: {fc}")
-                        return fc
-                except:
-                    continue
+                if shape_map.get(fc) == "Point":
+                    print(f"Using Point geometry template for {feature_type}: {fc}")
+                    return fc
             
             print(f"Warning: No Point geometry found for {feature_type}, using first available template")
         
         # Para los casos generales, usar el primer match
         first_match = matches[0]
-        geometry_type = arcpy.Describe(first_match).shapeType
+        geometry_type = shape_map.get(first_match)
         print(f"Using template for {feature_type}: {first_match} ({geometry_type})")
         return first_match
@@ -1,8 +1,46 @@
 # -*- coding: utf-8 -*-
+import bisect
+import io
+import logging
+import multiprocessing.util
 import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
 import zipfile
 import patoolib
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from logging.handlers import QueueHandler, QueueListener
+
+log = logging.getLogger(__name__)
+
+# Buffer de copia reutilizado por cada hilo de extracción (ver _copy_member)
+_thread_buffers = threading.local()
+# O_BINARY evita la traducción de saltos de línea en Windows
+_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+
+def _init_worker():
+    """
+    Inicializador de los procesos de extracción.
+
+    Los procesos hijos no heredan la configuración de logging de main().
+    Los hilos de extracción solo encolan los registros; un único hilo
+    QueueListener los escribe, sin competir por el lock de la salida.
+    """
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = QueueListener(records, handler)
+    listener.start()
+    # Vacía la cola al terminar el worker
+    multiprocessing.util.Finalize(None, listener.stop, exitpriority=10)
+
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(records)]
+    root.setLevel(logging.INFO)
 
 class ZipExtractor:
     """
@@ -13,6 +51,72 @@ class ZipExtractor:
     """
     
     ZIP_EXTENSIONS = ('.zip', '.z01')
+    # Comprobaciones de extensión sin crear una copia en minúsculas por nombre
+    _ZIP_RE = re.compile(r'\.zip\Z', re.IGNORECASE)
+    _NESTED_RE = re.compile(r'\.(?:zip|z01)\Z', re.IGNORECASE)
+    _SPLIT_RE = re.compile(r'\.z01\Z', re.IGNORECASE)
+    # Tamaño del buffer de copia por miembro (1 MiB)
+    COPY_BUFFER_SIZE = 1 << 20
+    # Tamaño máximo de ZIP anidado que se mantiene en memoria (256 MiB)
+    SPOOL_MAX_SIZE = 256 << 20
+    # Por debajo de esta razón comprimido/original, la extracción es de CPU
+    CPU_BOUND_RATIO = 0.9
+
+    def __init__(self, max_workers=None, use_processes=False):
+        """
+        Inicializa el extractor.
+
+        Args:
+            max_workers (int, opcional): Hilos del pool de extracción.
+                                         Por defecto min(16, núcleos)
+            use_processes (bool): Envía los ZIPs comprimidos de subdirectorios
+                                  a procesos (descompresión DEFLATE intensiva
+                                  en CPU); los almacenados siguen en hilos
+
+        Atributos:
+            max_workers (int): Tamaño de los pools compartidos
+            use_processes (bool): Reparto de ZIPs de subdirectorios por compresión
+            _pool (ThreadPoolExecutor): Pool de hilos compartido, creado al primer uso
+            _proc_pool (ProcessPoolExecutor): Pool de procesos, creado al primer uso
+        """
+        self.max_workers = max_workers or min(16, os.cpu_count() or 4)
+        self.use_processes = use_processes
+        self._pool = None
+        self._proc_pool = None
+
+    def _thread_pool(self):
+        """
+        Devuelve el pool de hilos compartido, creándolo si no existe.
+
+        Returns:
+            ThreadPoolExecutor: Pool reutilizado entre llamadas
+        """
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def _process_pool(self):
+        """
+        Devuelve el pool de procesos compartido, creándolo si no existe.
+
+        Returns:
+            ProcessPoolExecutor: Pool para ZIPs limitados por CPU
+        """
+        if self._proc_pool is None:
+            self._proc_pool = ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_init_worker
+            )
+        return self._proc_pool
+
+    def close(self):
+        """
+        Libera los pools compartidos que se llegaron a crear.
+        """
+        for name in ('_pool', '_proc_pool'):
+            pool = getattr(self, name)
+            if pool is not None:
+                pool.shutdown(wait=True)
+                setattr(self, name, None)
 
     def process_directory(self, input_dir, output_dir=None):
         """
@@ -25,40 +129,53 @@ class ZipExtractor:
         
         Comportamiento:
         1. Verifica si el directorio de entrada existe
-        2. Localiza todos los archivos .zip en el directorio
-        3. Crea un ThreadPool para procesamiento paralelo
+        2. Localiza todos los archivos .zip en el directorio, ordenados de
+           mayor a menor tamaño
+        3. Reparte los ZIP entre procesos (la descompresión es CPU y retiene el GIL)
         4. Para cada ZIP:
            - Crea un subdirectorio con el nombre del ZIP
            - Extrae el contenido usando extract_nested_zip()
            - Procesa recursivamente cualquier ZIP encontrado
         """
         if not os.path.isdir(input_dir):
-            print(f"El directorio {input_dir} no existe.")
+            log.error("El directorio %s no existe.", input_dir)
             return
 
         output_dir = output_dir or input_dir
-        files = [f for f in os.listdir(input_dir) if f.lower().endswith('.zip')]
-
-        # Procesar archivos ZIP en paralelo
-        with ThreadPoolExecutor() as executor:
-            futures = []
-            for file in files:
-                input_zip = os.path.join(input_dir, file)
-                zip_output_dir = os.path.join(output_dir, os.path.splitext(file)[0])
-                os.makedirs(zip_output_dir, exist_ok=True)
-                
-                print(f"Procesando archivo: {file}")
-                futures.append(
-                    executor.submit(self.extract_nested_zip, input_zip, zip_output_dir)
-                )
-            
-            # Espera a que todas las tareas se completen
-            for future in futures:
-                zip_output_dir = future.result()
-                if zip_output_dir and os.path.exists(zip_output_dir):
-                    self.extract_all_zips_in_subdirectories(zip_output_dir)
+        # Mayores primero: el ZIP más grande no queda solo al final del pool
+        with os.scandir(input_dir) as it:
+            files = [
+                (entry.stat().st_size, entry.name, entry.path)
+                for entry in it
+                if self._ZIP_RE.search(entry.name) and entry.is_file(follow_symlinks=False)
+            ]
+        files.sort(reverse=True)
 
-        print("Todos los archivos ZIP han sido descomprimidos en sus respectivas carpetas.")
+        input_zips = []
+        zip_output_dirs = []
+        for _, file, path in files:
+            zip_output_dir = os.path.join(output_dir, os.path.splitext(file)[0])
+            os.makedirs(zip_output_dir, exist_ok=True)
+
+            log.debug("Procesando archivo: %s", file)
+            input_zips.append(path)
+            zip_output_dirs.append(zip_output_dir)
+
+        # Procesar archivos ZIP en paralelo, un proceso por núcleo
+        if input_zips:
+            workers = min(len(input_zips), os.cpu_count() or 1, self.max_workers)
+            # Los pools internos de cada worker se reparten el presupuesto de
+            # max_workers en lugar de multiplicarlo por el número de workers
+            inner_workers = max(1, self.max_workers // workers)
+            # Un ZIP por envío: agrupar en lotes juntaría los mayores en el mismo worker
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                # Cada worker recrea el extractor con su parte del presupuesto
+                list(executor.map(
+                    _extract_archive, input_zips, zip_output_dirs,
+                    repeat(inner_workers), repeat(self.use_processes)
+                ))
+
+        log.info("Todos los archivos ZIP han sido descomprimidos en sus respectivas carpetas.")
 
     def extract_nested_zip(self, input_zip, output_dir):
         """
@@ -73,58 +190,84 @@ class ZipExtractor:
             None: Si ocurre algún error
         
         Proceso:
-        1. Verifica existencia del archivo
-        2. Crea directorio temporal
-        3. Extrae el ZIP principal
-        4. Busca ZIPs anidados
-        5. Maneja casos especiales (.z01)
-        6. Limpia archivos temporales
-        """
-        if not os.path.isfile(input_zip):
-            print(f"El archivo {input_zip} no existe o no es un archivo válido.")
-            return None
-
-        temp_extract_dir = os.path.join(output_dir, "temp_extracted")
-        os.makedirs(temp_extract_dir, exist_ok=True)
+        1. Abre el ZIP (un archivo inexistente se informa al abrir, sin stat previo)
+        2. Busca ZIPs anidados en el índice del ZIP principal
+        3. ZIP anidado simple: se lee en memoria (o en un temporal si su tamaño
+           descomprimido supera SPOOL_MAX_SIZE) y se extrae directamente, sin
+           directorio intermedio
+        4. Archivo dividido (.z01): extrae las partes en un directorio temporal
+           y las lee como un único flujo concatenado; recurre a patoolib si
+           los desplazamientos del índice no encajan
+        5. Limpia archivos temporales y libera la caché del ZIP de entrada
+        """
+        temp_extract_dir = None
+        source = None
 
         try:
-            with zipfile.ZipFile(input_zip, 'r') as zip_ref:
-                zip_ref.extractall(temp_extract_dir)
+            source = open(input_zip, 'rb')
+            self._fadvise(source, 'POSIX_FADV_SEQUENTIAL')
+            with zipfile.ZipFile(source, 'r') as zip_ref:
+                # Solo ZIPs en la raíz del archivo principal
+                nested_files = [
+                    name for name in zip_ref.namelist()
+                    if '/' not in name and self._NESTED_RE.search(name)
+                ]
 
-            nested_files = [
-                f for f in os.listdir(temp_extract_dir) 
-                if f.lower().endswith(self.ZIP_EXTENSIONS)
-            ]
+                if not nested_files:
+                    log.warning("No se encontró archivo ZIP anidado en %s", input_zip)
+                    return None
+
+                split_parts = [name for name in nested_files if self._SPLIT_RE.search(name)]
+                if not split_parts:
+                    nested_file = nested_files[0]
+                    # En memoria hasta SPOOL_MAX_SIZE; por encima, archivo temporal.
+                    # SpooledTemporaryFile no vale: antes de Python 3.11 no
+                    # implementa seekable() y zipfile falla al abrirlo
+                    if zip_ref.getinfo(nested_file).file_size <= self.SPOOL_MAX_SIZE:
+                        nested_buffer = io.BytesIO()
+                    else:
+                        nested_buffer = tempfile.TemporaryFile()
+                    with nested_buffer as nested_data:
+                        with zip_ref.open(nested_file) as nested:
+                            shutil.copyfileobj(nested, nested_data, self.COPY_BUFFER_SIZE)
+                        nested_data.seek(0)
+                        with zipfile.ZipFile(nested_data, 'r') as nested_ref:
+                            self._extract_members(nested_ref, output_dir, parallel=True)
+                    log.info("Archivo ZIP anidado extraído: %s -> %s", input_zip, nested_file)
+                    return output_dir
 
-            if not nested_files:
-                print(f"No se encontró archivo ZIP anidado en {input_zip}")
-                return None
-
-            nested_file = nested_files[0]
-            nested_path = os.path.join(temp_extract_dir, nested_file)
-
-            if nested_file.lower().endswith('.z01'):
-                main_zip = nested_path[:-4] + '.zip'
-                if os.path.exists(main_zip):
-                    try:
-                        patoolib.extract_archive(main_zip, outdir=output_dir)
-                        print(f"Archivo dividido extraído: {main_zip}")
-                        os.remove(main_zip)
-                    except Exception as e:
-                        print(f"Error al extraer archivo dividido {main_zip}: {e}")
-                        return None
-            else:
-                with zipfile.ZipFile(nested_path, 'r') as zip_ref:
-                    zip_ref.extractall(output_dir)
-                print(f"Archivo ZIP anidado extraído: {nested_path}")
+                # Los archivos divididos necesitan sus partes en disco
+                temp_extract_dir = tempfile.mkdtemp(prefix='.zipex_', dir=output_dir)
+                self._extract_members(zip_ref, temp_extract_dir)
+
+            main_zip = os.path.join(temp_extract_dir, split_parts[0])[:-4] + '.zip'
+            if os.path.exists(main_zip):
+                if self._extract_split_stream(main_zip, output_dir):
+                    log.info("Archivo dividido extraído: %s", main_zip)
+                    return output_dir
+                try:
+                    patoolib.extract_archive(main_zip, outdir=output_dir)
+                    log.info("Archivo dividido extraído: %s", main_zip)
+                    os.remove(main_zip)
+                except Exception as e:
+                    log.error("Error al extraer archivo dividido %s: %s", main_zip, e)
+                    return None
 
             return output_dir
 
         except zipfile.BadZipFile:
-            print(f"Archivo ZIP inválido: {input_zip}")
+            log.error("Archivo ZIP inválido: %s", input_zip)
+            return None
+        except FileNotFoundError:
+            log.error("El archivo %s no existe o no es un archivo válido.", input_zip)
             return None
         finally:
-            self._cleanup_directory(temp_extract_dir)
+            if source is not None:
+                # El ZIP de entrada no se vuelve a leer: liberar su caché de páginas
+                self._fadvise(source, 'POSIX_FADV_DONTNEED')
+                source.close()
+            if temp_extract_dir is not None:
+                shutil.rmtree(temp_extract_dir, ignore_errors=True)
 
     def extract_all_zips_in_subdirectories(self, output_dir):
         """
@@ -134,46 +277,368 @@ class ZipExtractor:
             output_dir (str): Directorio base donde buscar archivos ZIP
         
         Proceso:
-        1. Recorre recursivamente todos los subdirectorios
+        1. Recorre recursivamente todos los subdirectorios (una pasada os.scandir)
         2. Identifica archivos ZIP
-        3. Extrae en paralelo usando ThreadPoolExecutor
-        4. Elimina los ZIPs procesados
+        3. Extrae en paralelo: con use_processes, los ZIPs comprimidos van al
+           pool de procesos y los almacenados al de hilos; si no, todos a hilos
+        4. Elimina los ZIPs procesados desde un hilo aparte, sin bloquear
+           a los hilos de extracción
         """
-        def extract_zip(zip_path, extract_folder):
-            try:
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(extract_folder)
-                os.remove(zip_path)
-            except zipfile.BadZipFile:
-                print(f"Archivo ZIP inválido: {zip_path}")
-
-        # Adquirir todos los archivos ZIP y sus subdirectorios de destino
-        zip_tasks = []
-        for folder_path, _, _ in os.walk(output_dir):
-            zip_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.zip')]
-            for zip_file in zip_files:
-                zip_path = os.path.join(folder_path, zip_file)
-                zip_tasks.append((zip_path, folder_path))
+        deletions = queue.SimpleQueue()
+
+        def drain_deletions():
+            while True:
+                zip_path = deletions.get()
+                if zip_path is None:
+                    break
+                try:
+                    os.remove(zip_path)
+                except OSError as e:
+                    log.error("No se pudo eliminar %s: %s", zip_path, e)
+
+        # Adquirir todos los archivos ZIP y sus subdirectorios de destino.
+        # Se materializa antes de extraer: la extracción escribe en el mismo
+        # árbol y un recorrido perezoso podría encontrar ZIPs a medio escribir
+        zip_tasks = list(self._iter_zips(output_dir))
         
-        # Procesar archivos ZIP en paralelo
-        with ThreadPoolExecutor() as executor:
-            executor.map(lambda x: extract_zip(*x), zip_tasks)
+        # Procesar archivos ZIP en paralelo con el pool compartido; los
+        # extraídos se eliminan desde el hilo de borrado según van terminando
+        deleter = threading.Thread(target=drain_deletions, daemon=True)
+        deleter.start()
+        try:
+            # ZIPs comprimidos (CPU) a procesos; almacenados (E/S) a hilos
+            cpu_tasks, io_tasks = [], zip_tasks
+            if self.use_processes:
+                cpu_tasks, io_tasks = [], []
+                for task in zip_tasks:
+                    if self._compression_ratio(task[0]) < self.CPU_BOUND_RATIO:
+                        cpu_tasks.append(task)
+                    else:
+                        io_tasks.append(task)
+
+            # map envía todas las tareas al momento: ambos pools trabajan a la vez
+            batches = []
+            for tasks, get_pool in ((cpu_tasks, self._process_pool), (io_tasks, self._thread_pool)):
+                if tasks:
+                    zip_paths, folders = zip(*tasks)
+                    # Lotes para amortizar el envío de tareas (solo aplica a procesos)
+                    chunksize = max(1, len(tasks) // (4 * self.max_workers))
+                    batches.append(get_pool().map(
+                        _extract_one_zip, zip_paths, folders, chunksize=chunksize
+                    ))
+            for results in batches:
+                for zip_path in results:
+                    if zip_path is not None:
+                        deletions.put(zip_path)
+        finally:
+            deletions.put(None)
+            deleter.join()
 
-    def _cleanup_directory(self, directory):
+    @staticmethod
+    def _compression_ratio(zip_path):
         """
-        Elimina directorios temporales y su contenido.
-        
+        Calcula la razón tamaño comprimido / original a partir del índice del ZIP.
+
         Args:
-            directory (str): Directorio a eliminar
-        
+            zip_path (str): Ruta del archivo ZIP
+
+        Returns:
+            float: Razón de compresión (1.0 si no se puede leer o está vacío)
+        """
+        try:
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                infos = zip_ref.infolist()
+        except (zipfile.BadZipFile, OSError):
+            return 1.0
+        total = sum(info.file_size for info in infos)
+        if not total:
+            return 1.0
+        return sum(info.compress_size for info in infos) / total
+
+    @staticmethod
+    def _fadvise(file_obj, advice):
+        """
+        Indica al sistema el patrón de acceso de un archivo abierto.
+
+        Args:
+            file_obj: Archivo abierto con descriptor (fileno)
+            advice (str): Nombre de la constante de os ('POSIX_FADV_...')
+
+        Comportamiento:
+        - Sin efecto donde os.posix_fadvise no existe (Windows, macOS)
+        """
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(file_obj.fileno(), 0, 0, getattr(os, advice))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _iter_zips(root):
+        """
+        Recorre recursivamente un directorio devolviendo los ZIP que contiene.
+
+        Args:
+            root (str): Directorio raíz a recorrer
+
+        Yields:
+            tuple: (ruta del ZIP, directorio que lo contiene)
+
+        Características:
+        - Usa os.scandir con una pila explícita en lugar de os.walk + os.listdir
+        - Reutiliza el tipo cacheado de DirEntry
+        """
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif ZipExtractor._ZIP_RE.search(entry.name) and entry.is_file(follow_symlinks=False):
+                        yield entry.path, directory
+
+    def _extract_members(self, zip_ref, target_dir, parallel=False):
+        """
+        Extrae los miembros de un ZIP copiándolos en bloques de tamaño fijo.
+
+        Args:
+            zip_ref (zipfile.ZipFile): Archivo ZIP abierto
+            target_dir (str): Directorio de destino
+            parallel (bool): Reparte los miembros entre el pool de hilos.
+                             Solo desde fuera del pool (evita bloqueos por
+                             tareas que esperan a otras del mismo pool)
+
         Seguridad:
-        - Solo elimina directorios que contengan "temp_extracted" o "nested_temp"
-        - Elimina archivos y subdirectorios de forma segura
-        """
-        if "temp_extracted" in directory or "nested_temp" in directory:
-            for root, dirs, files in os.walk(directory, topdown=False):
-                for file in files:
-                    os.remove(os.path.join(root, file))
-                for dir in dirs:
-                    os.rmdir(os.path.join(root, dir))
-            os.rmdir(directory)
\ No newline at end of file
+        - Rechaza miembros cuya ruta resuelta quede fuera de target_dir
+
+        Comportamiento:
+        - Crea cada directorio una sola vez antes de copiar
+        - zipfile serializa las lecturas del archivo compartido, mientras la
+          descompresión y la escritura de cada miembro corren en paralelo
+        """
+        root = os.path.abspath(target_dir)
+        members = []
+        # Directorios únicos: un makedirs por directorio, no por miembro
+        directories = {root}
+        for info in zip_ref.infolist():
+            target = os.path.abspath(os.path.join(root, info.filename))
+            if os.path.commonpath([root, target]) != root:
+                log.warning("Miembro fuera del directorio de destino, se omite: %s", info.filename)
+                continue
+
+            if info.is_dir():
+                directories.add(target)
+                continue
+
+            directories.add(os.path.dirname(target))
+            members.append((info, target))
+
+        for directory in sorted(directories, key=len):
+            os.makedirs(directory, exist_ok=True)
+
+        if parallel and len(members) > 1:
+            pool = self._thread_pool()
+            futures = [
+                pool.submit(self._copy_member, zip_ref, info, target)
+                for info, target in members
+            ]
+            for future in futures:
+                future.result()
+        else:
+            for info, target in members:
+                self._copy_member(zip_ref, info, target)
+
+    def _copy_member(self, zip_ref, info, target):
+        """
+        Copia un miembro del ZIP a su ruta de destino.
+
+        Args:
+            zip_ref (zipfile.ZipFile): Archivo ZIP abierto
+            info (zipfile.ZipInfo): Miembro a copiar
+            target (str): Ruta de destino (directorio padre ya creado)
+
+        Comportamiento:
+        - Reutiliza un único buffer por hilo en lugar de uno nuevo por miembro
+        - Escribe con os.write sobre el descriptor, sin objeto de archivo
+        """
+        buffer = getattr(_thread_buffers, 'buffer', None)
+        if buffer is None:
+            buffer = _thread_buffers.buffer = bytearray(self.COPY_BUFFER_SIZE)
+        view = memoryview(buffer)
+
+        fd = os.open(target, _WRITE_FLAGS, 0o644)
+        try:
+            with zip_ref.open(info) as src:
+                while True:
+                    count = src.readinto(buffer)
+                    if not count:
+                        break
+                    written = 0
+                    while written < count:
+                        written += os.write(fd, view[written:count])
+        finally:
+            os.close(fd)
+
+    def _extract_split_stream(self, main_zip, output_dir):
+        """
+        Extrae un ZIP dividido leyendo sus partes como un único flujo.
+
+        Args:
+            main_zip (str): Ruta de la última parte (.zip) del archivo dividido
+            output_dir (str): Directorio donde se extraerá el contenido
+
+        Returns:
+            bool: True si se extrajo sin lanzar un proceso externo
+
+        Comportamiento:
+        - Concatena .z01, .z02, ... y .zip sin copiarlos a disco
+        - Traduce el offset de cada miembro (relativo a su parte) a su
+          posición en el flujo concatenado
+        - Comprueba que cada cabecera local esté donde indica el índice
+          antes de escribir nada; si no, devuelve False para usar patoolib
+        """
+        base = main_zip[:-4]
+        directory = os.path.dirname(main_zip)
+        prefix = os.path.basename(base).lower() + '.z'
+        numbered = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                suffix = entry.name[len(prefix):]
+                if entry.name.lower().startswith(prefix) and suffix.isdigit():
+                    numbered.append((int(suffix), entry.path))
+        # Orden numérico: .z100 va después de .z11
+        parts = [path for _, path in sorted(numbered)]
+        parts.append(main_zip)
+
+        try:
+            with _MultiFileStream(parts) as stream, zipfile.ZipFile(stream, 'r') as zip_ref:
+                starts = stream.part_starts
+                # zipfile desplaza los offsets con el inicio de la parte que
+                # contiene el directorio central; los de cada miembro son
+                # relativos a su propia parte (info.volume)
+                concat = starts[bisect.bisect_right(starts, zip_ref.start_dir) - 1]
+                for info in zip_ref.infolist():
+                    if info.volume >= len(starts):
+                        return False
+                    info.header_offset = starts[info.volume] + info.header_offset - concat
+                    stream.seek(info.header_offset)
+                    if stream.read(4) != b'PK\x03\x04':
+                        return False
+                self._extract_members(zip_ref, output_dir, parallel=True)
+            return True
+        except (zipfile.BadZipFile, OSError, ValueError):
+            return False
+
+class _MultiFileStream(io.RawIOBase):
+    """
+    Flujo de solo lectura que presenta varias partes de archivo como una sola.
+
+    Args:
+        paths (list): Rutas de las partes en orden
+    """
+
+    def __init__(self, paths):
+        super().__init__()
+        self._files = [open(path, 'rb') for path in paths]
+        self._starts = []
+        total = 0
+        for f in self._files:
+            self._starts.append(total)
+            total += os.fstat(f.fileno()).st_size
+        self._size = total
+        self._pos = 0
+
+    @property
+    def part_starts(self):
+        """list: Posición de inicio de cada parte dentro del flujo"""
+        return list(self._starts)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError("Posición negativa")
+        self._pos = offset
+        return self._pos
+
+    def readinto(self, buffer):
+        # Llena el buffer cruzando límites de parte: zipfile espera lecturas
+        # completas (p. ej. un directorio central repartido en dos partes)
+        view = memoryview(buffer)
+        total = 0
+        while total < len(view) and self._pos < self._size:
+            idx = bisect.bisect_right(self._starts, self._pos) - 1
+            f = self._files[idx]
+            f.seek(self._pos - self._starts[idx])
+            end = self._starts[idx + 1] if idx + 1 < len(self._starts) else self._size
+            count = f.readinto(view[total:total + min(len(view) - total, end - self._pos)])
+            if not count:
+                break
+            self._pos += count
+            total += count
+        return total
+
+    def close(self):
+        for f in self._files:
+            f.close()
+        super().close()
+
+def _extract_one_zip(zip_path, extract_folder):
+    """
+    Extrae un ZIP encontrado en los subdirectorios.
+
+    Args:
+        zip_path (str): Ruta del archivo ZIP
+        extract_folder (str): Directorio donde se extraerá el contenido
+
+    Returns:
+        str: zip_path si se extrajo y puede eliminarse, None si no
+
+    Función de módulo para poder usarla tanto con hilos como con procesos.
+    """
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            ZipExtractor()._extract_members(zip_ref, extract_folder)
+        return zip_path
+    except zipfile.BadZipFile:
+        log.error("Archivo ZIP inválido: %s", zip_path)
+    except Exception as e:
+        log.error("Error al extraer %s: %s", zip_path, e)
+    return None
+
+def _extract_archive(input_zip, output_dir, max_workers=None, use_processes=False):
+    """
+    Extrae un ZIP de entrada completo dentro de un proceso worker.
+
+    Args:
+        input_zip (str): Ruta del archivo ZIP a extraer
+        output_dir (str): Directorio donde se extraerá el contenido
+        max_workers (int, opcional): Parte del max_workers del extractor padre
+                                     que corresponde a este worker
+        use_processes (bool): use_processes del extractor del proceso padre
+
+    Returns:
+        str: Directorio de salida si la extracción fue exitosa, None si no
+
+    Función de módulo para que ProcessPoolExecutor pueda serializarla.
+    """
+    extractor = ZipExtractor(max_workers=max_workers, use_processes=use_processes)
+    try:
+        result = extractor.extract_nested_zip(input_zip, output_dir)
+        if result and os.path.exists(result):
+            extractor.extract_all_zips_in_subdirectories(result)
+        return result
+    finally:
+        extractor.close()